@@ -1,16 +1,22 @@
 import streamlit as st
-from supabase import create_client, Client
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
+import os
+import tempfile
+from pathlib import Path
+import duckdb
+import psycopg
+from db import get_supabase, get_pg_connection
+from tsdownsample import MinMaxLTTBDownsampler
 
 # --- 1. OPSÆTNING ---
 st.set_page_config(page_title="Himmelstrup SEO", layout="wide", page_icon="bar_chart")
 
-# Custom CSS for et rent, professionelt sort/hvidt look
-st.markdown("""
+# Custom CSS for et rent, professionelt sort/hvidt look.
+# Den skal sendes ved hver kørsel (Streamlit fjerner elementer der ikke gentages),
+# så whitespace fjernes for at holde hver rerun-delta lille
+CUSTOM_CSS = " ".join("""
 <style>
-    .streamlit-expanderHeader {font-size: 16px; font-weight: 600; color: #333;}
     div[data-testid="stMetricValue"] {font-size: 28px; font-family: 'Helvetica', sans-serif;}
     h1, h2, h3 {color: #000 !important;}
     .stTabs [data-baseweb="tab-list"] button [data-testid="stMarkdownContainer"] p {
@@ -18,42 +24,182 @@ st.markdown("""
        font-weight: 500;
     }
 </style>
-""", unsafe_allow_html=True)
+""".split())
 
-@st.cache_resource
-def init_connection():
-    try:
-        url = st.secrets["supabase"]["url"]
-        key = st.secrets["supabase"]["key"]
-        return create_client(url, key)
-    except Exception as e:
-        st.error(f"Database fejl: {e}")
-        st.stop()
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
-supabase = init_connection()
+supabase = get_supabase()
 
 # --- 2. DATA FUNKTIONER ---
+def _fetch_snapshots(conn):
+    with conn.cursor(binary=True) as cur:
+        cur.execute(
+            "SELECT created_at AT TIME ZONE 'UTC' AS created_at, overall_score, gsc_clicks, gsc_ctr, psi_mobile_score, psi_lcp "
+            "FROM seo_snapshots ORDER BY created_at DESC LIMIT 30"
+        )
+        names = [c.name for c in cur.description]
+        rows = cur.fetchall()
+    # Bygger DataFrame kolonne for kolonne i stedet for række for række;
+    # created_at er allerede datetime-objekter (UTC) og skal ikke parses som tekst
+    return pd.DataFrame({
+        name: np.array(col, dtype='datetime64[us]') if name == 'created_at' else np.asarray(col)
+        for name, col in zip(names, zip(*rows))
+    }, columns=names)
+
+# Fejl fanges af kalderen, så et mislykket kald ikke caches som en tom frame
+@st.cache_data(ttl=60, show_spinner=False)
 def get_seo_data():
     try:
-        response = supabase.table("seo_snapshots").select("*").order("created_at", desc=True).limit(30).execute()
-        df = pd.DataFrame(response.data)
-        if not df.empty:
-            df['created_at'] = pd.to_datetime(df['created_at'])
-        return df
+        return _fetch_snapshots(get_pg_connection())
+    except psycopg.OperationalError:
+        # Pooleren har droppet forbindelsen: genopret den og prøv én gang til
+        get_pg_connection.clear()
+        return _fetch_snapshots(get_pg_connection())
+
+# KPI-række (LAG()-deltaer fra get_latest_kpi()) og åbne opgaver i ét RPC-kald.
+# Fejl fanges af kalderen, så et mislykket kald ikke caches som tomt resultat
+@st.cache_data(ttl=60, show_spinner=False)
+def get_dashboard_bootstrap():
+    data = supabase.rpc("dashboard_bootstrap").execute().data or {}
+    kpi = data.get('kpi') or {}
+    if kpi:
+        kpi['created_at'] = pd.Timestamp(kpi['created_at'])
+    return kpi, data.get('tasks') or []
+
+# Lokal Parquet-kopi af historikken, så kun nye rækker hentes fra Supabase
+PAGE_PERF_CACHE = Path("data/page_perf.parquet")
+PAGE_PERF_COLUMNS = ['page_name', 'clicks', 'impressions', 'ctr', 'position', 'created_at']
+PAGE_SIZE = 1000  # PostgRESTs standardgrænse pr. svar
+PAGE_CACHE_ENTRIES = 50  # ca. antal sider; loft for caches pr. valgt side
+
+def _read_page_perf_cache():
+    try:
+        cached = pd.read_parquet(PAGE_PERF_CACHE, columns=PAGE_PERF_COLUMNS, dtype_backend='pyarrow')
+        cached['created_at'] = cached['created_at'].astype('datetime64[ns, UTC]')
+        return cached
     except Exception:
+        # Manglende eller ødelagt fil: start forfra med en fuld hentning
         return pd.DataFrame()
 
-def get_pending_tasks():
+def _write_page_perf_cache(df):
+    # Skriv til en midlertidig fil og byt den ind, så læsere aldrig ser en halv fil
+    PAGE_PERF_CACHE.parent.mkdir(exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=PAGE_PERF_CACHE.parent, suffix=".tmp")
+    os.close(fd)
     try:
-        response = supabase.table("seo_tasks").select("*").eq("status", "pending").order("created_at", desc=True).execute()
-        return response.data
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, PAGE_PERF_CACHE)
     except Exception:
-        return []
+        os.remove(tmp_path)
+        raise
+
+def _fetch_page_perf_since(since):
+    # page_perf_m4_since() filtrerer basistabellen før M4-vinduerne;
+    # stigende rækkefølge i sider med .range(), så intet afskæres af svargrænsen
+    rows, start = [], 0
+    while True:
+        batch = supabase.rpc("page_perf_m4_since", {"since": since.isoformat()})\
+            .select(",".join(PAGE_PERF_COLUMNS))\
+            .order("created_at")\
+            .order("page_name")\
+            .range(start, start + PAGE_SIZE - 1)\
+            .execute().data
+        rows.extend(batch)
+        if len(batch) < PAGE_SIZE:
+            return rows
+        start += PAGE_SIZE
 
-def mark_task_done(task_id):
-    supabase.table("seo_tasks").update({"status": "done"}).eq("id", task_id).execute()
-    st.cache_data.clear()
-    st.rerun()
+@st.cache_data(ttl=300)
+def get_page_performance():
+    cached = _read_page_perf_cache()
+
+    if cached.empty:
+        rows = supabase.table("page_perf_m4")\
+            .select(",".join(PAGE_PERF_COLUMNS))\
+            .order("created_at", desc=True)\
+            .limit(PAGE_SIZE)\
+            .execute().data
+    else:
+        # Seneste døgns M4-bucket kan stadig ændre sig, så det døgn hentes forfra
+        since = cached['created_at'].max().floor('D')
+        cached = cached[cached['created_at'] < since]
+        rows = _fetch_page_perf_since(since)
+
+    # Arrow-backede kolonner, så st.dataframe kan serialisere uden konvertering
+    new = pd.DataFrame(rows).convert_dtypes(dtype_backend='pyarrow')
+    if not new.empty:
+        new['created_at'] = pd.to_datetime(new['created_at'], utc=True, format='ISO8601', cache=True)
+    if new.empty or cached.empty:
+        df = cached if new.empty else new
+    else:
+        df = pd.concat([new, cached], ignore_index=True)
+    if not df.empty:
+        # Nyeste først, som resten af fanen forventer
+        df = df.sort_values('created_at', ascending=False, ignore_index=True)
+        _write_page_perf_cache(df)
+    return df
+
+# Udvælgelser på historikken køres i DuckDB's kolonneorienterede motor
+# (caches med samme cache_key som graferne)
+def _register_vip(con, df):
+    con.execute("SET TimeZone = 'UTC'")
+    con.register('vip', df)
+
+@st.cache_data(ttl=300, max_entries=2, show_spinner=False)
+def get_latest_per_page(cache_key, _df):
+    with duckdb.connect() as con:
+        _register_vip(con, _df)
+        # Arrow-backet resultat til st.dataframe
+        return con.execute("""
+            SELECT page_name, clicks, impressions, ctr, position, created_at
+            FROM vip
+            QUALIFY row_number() OVER (PARTITION BY page_name ORDER BY created_at DESC) = 1
+            ORDER BY clicks DESC
+        """).to_arrow_table().to_pandas(types_mapper=pd.ArrowDtype)
+
+@st.cache_data(ttl=300, max_entries=PAGE_CACHE_ENTRIES, show_spinner=False)
+def get_page_history(cache_key, page, _df):
+    with duckdb.connect() as con:
+        _register_vip(con, _df)
+        # .df() giver nullable Int64 for heltalskolonner med null; castes til float64,
+        # så downsampling og graferne får almindelige NumPy-arrays med NaN
+        return con.execute("""
+            SELECT created_at, position, impressions, clicks, ctr
+            FROM vip
+            WHERE page_name = ?
+            ORDER BY created_at
+        """, [page]).df().astype({'position': 'float64', 'impressions': 'float64', 'clicks': 'float64', 'ctr': 'float64'})
+
+# on_change for opgave-editoren: kører før næste rerun, så positionerne i
+# edited_rows hører til netop den frame der blev vist
+def _record_task_ticks(shown_ids):
+    pending = st.session_state.setdefault('_pending_done', set())
+    for pos, change in st.session_state["tasks_editor"]["edited_rows"].items():
+        if "done" in change:
+            task_id = shown_ids[int(pos)]
+            if change["done"]:
+                pending.add(task_id)
+            else:
+                pending.discard(task_id)
+
+def mark_tasks_done(task_ids):
+    supabase.table("seo_tasks").update({"status": "done"}).in_("id", task_ids).execute()
+
+# Reducerer tidsserier til det antal punkter grafen reelt kan vise
+def downsample(df, x, y, n_out=500):
+    if len(df) <= n_out:
+        return df
+    cols = [y] if isinstance(y, str) else y
+    df = df.dropna(subset=cols).sort_values(x)
+    if len(df) <= n_out:
+        return df
+    ts = df[x].values.astype('int64')
+    # MinMaxLTTB pr. serie; for flere y-kolonner bevares foreningen af punkterne
+    idx = np.unique(np.concatenate([
+        MinMaxLTTBDownsampler().downsample(ts, df[col].to_numpy(dtype='float64'), n_out=n_out)
+        for col in cols
+    ]))
+    return df.iloc[idx]
 
 # Hjælpefunktion til stilrene grafer
 def clean_plot(fig):
@@ -68,35 +214,145 @@ def clean_plot(fig):
     fig.update_yaxes(showgrid=True, gridcolor='#eeeeee', linecolor='black')
     return fig
 
+# plotly.express importeres kun når en graf faktisk skal bygges. st.plotly_chart
+# indlæser selv plotly.io/graph_objs og validerer dict'en som Figure ved hver kørsel,
+# så ved cache-hits er det kun px-importen og px.line-arbejdet der spares
+def _plotly_modules():
+    import plotly.express as px
+    import plotly.graph_objects as go
+    return px, go
+
+# --- GRAF BYGGERE ---
+# Figurerne caches som dicts (Figure-objekter kan ikke caches direkte).
+# cache_key er nyeste created_at, så px/downsampling kun køres igen når der kommer
+# ny data (st.plotly_chart validerer stadig den fulde Figure ved hver rerun);
+# DataFrames med underscore-prefix hashes ikke af st.cache_data.
+@st.cache_data(ttl=60, max_entries=2, show_spinner=False)
+def build_score_fig(cache_key, _df):
+    px, _ = _plotly_modules()
+    fig = px.line(downsample(_df, "created_at", "psi_mobile_score"), x="created_at", y="psi_mobile_score", 
+                  title="Mobil Score",
+                  markers=True,
+                  render_mode='webgl',
+                  color_discrete_sequence=["black"]) # Sort linje
+    fig.add_hline(y=90, line_dash="dot", annotation_text="Mål", annotation_position="bottom right", line_color="#999")
+    fig.update_yaxes(range=[0, 105])
+    return clean_plot(fig).to_dict()
+
+@st.cache_data(ttl=60, max_entries=2, show_spinner=False)
+def build_clicks_fig(cache_key, _df):
+    px, _ = _plotly_modules()
+    fig = px.line(downsample(_df, "created_at", "gsc_clicks"), x="created_at", y="gsc_clicks", 
+                  title="Organiske Klik",
+                  markers=True,
+                  render_mode='webgl',
+                  color_discrete_sequence=["black"])
+    # Tilføj fill under grafen for visuel vægt
+    fig.update_traces(fill='tozeroy', fillcolor='rgba(0,0,0,0.05)') 
+    return clean_plot(fig).to_dict()
+
+@st.cache_data(ttl=60, max_entries=2, show_spinner=False)
+def build_lcp_fig(cache_key, _df):
+    px, _ = _plotly_modules()
+    fig = px.line(downsample(_df, "created_at", "psi_lcp"), x="created_at", y="psi_lcp", 
+                  title="LCP Hastighed (sek)",
+                  markers=True,
+                  render_mode='webgl',
+                  color_discrete_sequence=["black"])
+    fig.add_hline(y=2.5, line_dash="dot", annotation_text="Grænse", annotation_position="top right", line_color="#999")
+    return clean_plot(fig).to_dict()
+
+@st.cache_data(ttl=60, max_entries=2, show_spinner=False)
+def build_ctr_fig(cache_key, _df):
+    px, _ = _plotly_modules()
+    fig = px.line(downsample(_df, "created_at", "gsc_ctr"), x="created_at", y="gsc_ctr", 
+                  title="Click-Through Rate (%)",
+                  markers=True,
+                  render_mode='webgl',
+                  color_discrete_sequence=["black"])
+    fig.add_hline(y=0.02, line_dash="dot", annotation_text="Mål", line_color="#999")
+    return clean_plot(fig).to_dict()
+
+@st.cache_data(ttl=300, max_entries=PAGE_CACHE_ENTRIES, show_spinner=False)
+def build_rank_fig(cache_key, page, _history):
+    px, _ = _plotly_modules()
+    fig = px.line(downsample(_history, "created_at", "position"), x="created_at", y="position", 
+                  title=f"Ranking: {page}",
+                  markers=True,
+                  render_mode='webgl',
+                  color_discrete_sequence=["black"])
+    fig['layout']['yaxis']['autorange'] = "reversed" 
+    return clean_plot(fig).to_dict()
+
+@st.cache_data(ttl=300, max_entries=PAGE_CACHE_ENTRIES, show_spinner=False)
+def build_page_traffic_fig(cache_key, page, _history):
+    # To serier: traces bygges direkte fra kolonnerne i stedet for px.line's melt til long form
+    _, go = _plotly_modules()
+    history = downsample(_history, "created_at", ["impressions", "clicks"])
+    ts = history['created_at'].values
+    fig = go.Figure([
+        go.Scattergl(x=ts, y=history[col].to_numpy(dtype='float64', na_value=np.nan),
+                     mode='lines+markers', name=col, line_color=color)
+        for col, color in [("impressions", "#999999"), ("clicks", "#000000")] # Grå for visninger, sort for klik
+    ])
+    fig.update_layout(title=f"Trafik: {page}", xaxis_title="created_at", yaxis_title="value", legend_title_text="variable")
+    return clean_plot(fig).to_dict()
+
+@st.cache_data(ttl=300, max_entries=PAGE_CACHE_ENTRIES, show_spinner=False)
+def build_page_ctr_fig(cache_key, page, _history):
+    px, _ = _plotly_modules()
+    fig = px.line(downsample(_history, "created_at", "ctr"), x="created_at", y="ctr", 
+                  title="CTR (%)",
+                  markers=True,
+                  render_mode='webgl',
+                  color_discrete_sequence=["black"])
+    return clean_plot(fig).to_dict()
+
+# Minimalistiske prioritetsikoner; alt andet end "Høj" vises som "○"
+PRIO_ICONS = {"Høj": "⚡"}
+
 # --- 3. DASHBOARD START ---
 st.title("Himmelstrup Events SEO")
 st.markdown("---")
 
-df = get_seo_data()
-tasks = get_pending_tasks()
+bootstrap_failed = False
+try:
+    latest, tasks = get_dashboard_bootstrap()
+except Exception as e:
+    st.error(f"Kunne ikke hente KPI'er og opgaver: {e}")
+    latest, tasks, bootstrap_failed = {}, [], True
 
-if df.empty:
+try:
+    df = get_seo_data()
+except Exception as e:
+    st.error(f"Kunne ikke hente snapshot-data: {e}")
+    st.stop()
+
+# Ved en fejlet bootstrap vises fejlen ovenfor, og resten af dashboardet bygges uden KPI'er
+if df.empty or (not latest and not bootstrap_failed):
     st.info("Systemet indsamler data...")
     st.stop()
 
+# KPI-felterne kan være null i get_latest_kpi() og vises da som "–"
+def fmt_kpi(value, suffix=""):
+    return "–" if value is None else f"{value}{suffix}"
+
 # --- TOP KPI SEKTION ---
-latest = df.iloc[0]
-delta_score = 0 
-if len(df) > 1:
-    delta_score = int(latest['overall_score'] or 0) - int(df.iloc[1]['overall_score'] or 0)
-
-# KPI Grid
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    st.metric("Overall Score", f"{latest['overall_score']}/100", delta_score)
-with col2:
-    st.metric("Trafik (30d)", f"{latest['gsc_clicks']}", help="Organiske klik")
-with col3:
-    st.metric("PageSpeed", f"{latest['psi_mobile_score']}/100")
-with col4:
-    lcp_val = latest['psi_lcp']
-    # Bruger standard delta colors da de er universelle (grøn/rød) for metrics
-    st.metric("LCP Tid", f"{lcp_val} s", delta_color="inverse" if lcp_val > 2.5 else "normal")
+if latest:
+    delta_score, delta_clicks = int(latest['delta_score']), int(latest['delta_clicks'])
+
+    # KPI Grid
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Overall Score", fmt_kpi(latest['overall_score'], "/100"), delta_score)
+    with col2:
+        st.metric("Trafik (30d)", fmt_kpi(latest['gsc_clicks']), delta_clicks, help="Organiske klik")
+    with col3:
+        st.metric("PageSpeed", fmt_kpi(latest['psi_mobile_score'], "/100"))
+    with col4:
+        lcp_val = latest['psi_lcp']
+        # Bruger standard delta colors da de er universelle (grøn/rød) for metrics
+        st.metric("LCP Tid", fmt_kpi(lcp_val, " s"), delta_color="inverse" if lcp_val is not None and lcp_val > 2.5 else "normal")
 
 st.write("") 
 
@@ -112,7 +368,8 @@ with tab_overview:
         st.info(latest['semantisk_analyse'], icon="ℹ️") # Standard info icon er diskret
     else:
         st.text("Ingen analyse tekst fundet.")
-    st.caption(f"Sidst opdateret: {latest['created_at'].strftime('%d-%m %H:%M')}")
+    if latest:
+        st.caption(f"Sidst opdateret: {latest['created_at'].strftime('%d-%m %H:%M')}")
     
     st.divider()
     
@@ -120,83 +377,88 @@ with tab_overview:
     st.subheader("Detaljeret Udvikling")
     
     g_col1, g_col2 = st.columns(2)
+    df_key = df['created_at'].iloc[0].value
     
     with g_col1:
         # GRAF 1: TEKNISK SCORE
-        fig_score = px.line(df, x="created_at", y="psi_mobile_score", 
-                          title="Mobil Score",
-                          markers=True,
-                          color_discrete_sequence=["black"]) # Sort linje
-        fig_score.add_hline(y=90, line_dash="dot", annotation_text="Mål", annotation_position="bottom right", line_color="#999")
-        fig_score.update_yaxes(range=[0, 105])
-        st.plotly_chart(clean_plot(fig_score), use_container_width=True)
+        st.plotly_chart(build_score_fig(df_key, df), use_container_width=True)
 
         # GRAF 3: KLIK
-        fig_clicks = px.line(df, x="created_at", y="gsc_clicks", 
-                           title="Organiske Klik",
-                           markers=True,
-                           color_discrete_sequence=["black"])
-        # Tilføj fill under grafen for visuel vægt
-        fig_clicks.update_traces(fill='tozeroy', fillcolor='rgba(0,0,0,0.05)') 
-        st.plotly_chart(clean_plot(fig_clicks), use_container_width=True)
+        st.plotly_chart(build_clicks_fig(df_key, df), use_container_width=True)
 
     with g_col2:
         # GRAF 2: LCP
-        fig_lcp = px.line(df, x="created_at", y="psi_lcp", 
-                        title="LCP Hastighed (sek)",
-                        markers=True,
-                        color_discrete_sequence=["black"])
-        fig_lcp.add_hline(y=2.5, line_dash="dot", annotation_text="Grænse", annotation_position="top right", line_color="#999")
-        st.plotly_chart(clean_plot(fig_lcp), use_container_width=True)
+        st.plotly_chart(build_lcp_fig(df_key, df), use_container_width=True)
 
         # GRAF 4: CTR
-        fig_ctr = px.line(df, x="created_at", y="gsc_ctr", 
-                        title="Click-Through Rate (%)",
-                        markers=True,
-                        color_discrete_sequence=["black"])
-        fig_ctr.add_hline(y=0.02, line_dash="dot", annotation_text="Mål", line_color="#999")
-        st.plotly_chart(clean_plot(fig_ctr), use_container_width=True)
+        st.plotly_chart(build_ctr_fig(df_key, df), use_container_width=True)
 
 # --- FANE 2: OPGAVER ---
 with tab_tasks:
     st.write("")
-    if not tasks:
+    if bootstrap_failed:
+        st.warning("Opgaverne kunne ikke hentes.")
+    elif not tasks:
         st.success("Ingen åbne opgaver.")
     else:
         st.markdown("##### Aktuelle indsatser")
-        for task in tasks:
-            # Minimalistiske ikoner
-            prio_icon = "⚡" if task.get('priority') == "Høj" else "○"
-            
-            with st.expander(f"{prio_icon} {task['task_name']}  |  {task.get('task_type', 'Opgave')}"):
-                c_desc, c_btn = st.columns([4, 1])
-                with c_desc:
-                    if task.get('description_why'):
-                        st.markdown(f"**Hvorfor:** {task['description_why']}")
-                    if task.get('description_how'):
-                        st.markdown(f"**Løsning:** {task['description_how']}")
-                with c_btn:
-                    st.write("") 
-                    if st.button("Marker som udført", key=f"btn_{task['id']}", use_container_width=True):
-                        mark_task_done(task['id'])
+        df_tasks = pd.DataFrame(tasks)
+        df_tasks['prio_icon'] = df_tasks['priority'].map(PRIO_ICONS).fillna("○")
+        df_tasks['task_type'] = df_tasks['task_type'].fillna("Opgave")
+
+        # Afkrydsede opgave-ID'er samles og gemmes først ved klik på "Anvend ændringer"
+        shown_ids = df_tasks['id'].tolist()
+        pending = st.session_state.setdefault('_pending_done', set())
+        if st.session_state.get('_tasks_shown') != shown_ids:
+            # Ny opgaveliste (fx efter TTL): nulstil editoren, så flueben ikke flytter til andre rækker
+            st.session_state.pop("tasks_editor", None)
+            st.session_state['_tasks_shown'] = shown_ids
+        pending &= set(shown_ids)
+        df_tasks['done'] = df_tasks['id'].isin(pending)
+
+        # Én editor for alle opgaver i stedet for expander + knap pr. opgave
+        st.data_editor(
+            df_tasks[['done', 'prio_icon', 'task_name', 'task_type', 'description_why', 'description_how', 'id']],
+            column_config={
+                "done": st.column_config.CheckboxColumn("Udført"),
+                "prio_icon": "",
+                "task_name": "Opgave",
+                "task_type": "Type",
+                "description_why": "Hvorfor",
+                "description_how": "Løsning",
+                "id": None,
+            },
+            disabled=['prio_icon', 'task_name', 'task_type', 'description_why', 'description_how'],
+            hide_index=True,
+            use_container_width=True,
+            key="tasks_editor",
+            on_change=_record_task_ticks,
+            args=(shown_ids,)
+        )
+
+        if st.button(f"Anvend ændringer ({len(pending)})", disabled=not pending):
+            try:
+                mark_tasks_done(list(pending))
+            except Exception as e:
+                # Fluebenene bevares, så brugeren kan prøve igen
+                st.error(f"Kunne ikke gemme opgaverne: {e}")
+            else:
+                # Nulstil editorens tilstand, så fluebenene ikke overføres til de resterende opgaver
+                del st.session_state["tasks_editor"]
+                st.session_state['_pending_done'] = set()
+                st.cache_data.clear()
+                st.rerun()
 
 # --- FANE 3: PRODUKTER ---
 with tab_products:
     st.subheader("Produkt Performance")
 
     try:
-        vip_data = supabase.table("page_performance")\
-            .select("*")\
-            .order("created_at", desc=True)\
-            .limit(1000)\
-            .execute()
-            
-        if vip_data.data:
-            df_vip = pd.DataFrame(vip_data.data)
-            df_vip['created_at'] = pd.to_datetime(df_vip['created_at'])
+        df_vip = get_page_performance()
             
-            latest_date = df_vip['created_at'].max()
-            df_latest = df_vip[df_vip['created_at'] == latest_date].sort_values('clicks', ascending=False)
+        if not df_vip.empty:
+            vip_key = df_vip['created_at'].iloc[0].value
+            df_latest = get_latest_per_page(vip_key, df_vip)
 
             # Tabel med rene progress bars
             st.dataframe(
@@ -215,34 +477,20 @@ with tab_products:
             st.divider()
             st.subheader("Dybdegående Analyse")
             
-            page_names = df_vip['page_name'].unique()
-            selected_page = st.selectbox("Vælg side:", page_names, index=0)
+            selected_page = st.selectbox("Vælg side:", df_latest['page_name'], index=0)
             
-            page_history = df_vip[df_vip['page_name'] == selected_page].sort_values("created_at")
+            page_history = get_page_history(vip_key, selected_page, df_vip)
 
             if not page_history.empty:
                 col_g1, col_g2 = st.columns(2)
                 
                 with col_g1:
-                    fig_rank = px.line(page_history, x="created_at", y="position", 
-                                     title=f"Ranking: {selected_page}",
-                                     markers=True,
-                                     color_discrete_sequence=["black"])
-                    fig_rank['layout']['yaxis']['autorange'] = "reversed" 
-                    st.plotly_chart(clean_plot(fig_rank), use_container_width=True)
+                    st.plotly_chart(build_rank_fig(vip_key, selected_page, page_history), use_container_width=True)
                     
                 with col_g2:
-                    fig_traf = px.line(page_history, x="created_at", y=["impressions", "clicks"], 
-                                     title=f"Trafik: {selected_page}",
-                                     markers=True,
-                                     color_discrete_map={"impressions": "#999999", "clicks": "#000000"}) # Grå for visninger, sort for klik
-                    st.plotly_chart(clean_plot(fig_traf), use_container_width=True)
+                    st.plotly_chart(build_page_traffic_fig(vip_key, selected_page, page_history), use_container_width=True)
                     
-                fig_ctr = px.line(page_history, x="created_at", y="ctr", 
-                                title="CTR (%)",
-                                markers=True,
-                                color_discrete_sequence=["black"])
-                st.plotly_chart(clean_plot(fig_ctr), use_container_width=True)
+                st.plotly_chart(build_page_ctr_fig(vip_key, selected_page, page_history), use_container_width=True)
         else:
             st.info("Ingen data fundet endnu.")
             
@@ -0,0 +1,24 @@
+import streamlit as st
+import psycopg
+from supabase import create_client, Client, ClientOptions
+
+# Fælles forbindelser, så alle sider i appen deler samme klient og pool
+
+@st.cache_resource
+def get_supabase() -> Client:
+    try:
+        url = st.secrets["supabase"]["url"]
+        key = st.secrets["supabase"]["key"]
+        return create_client(url, key, options=ClientOptions(postgrest_client_timeout=10))
+    except Exception as e:
+        st.error(f"Database fejl: {e}")
+        st.stop()
+
+# Direkte Postgres-forbindelse (binær protokol) til de tunge læsninger
+@st.cache_resource(validate=lambda conn: not conn.closed)
+def get_pg_connection() -> psycopg.Connection:
+    try:
+        return psycopg.connect(st.secrets["supabase"]["db_url"], autocommit=True)
+    except Exception as e:
+        st.error(f"Database fejl: {e}")
+        st.stop()
@@ -0,0 +1,25 @@
+-- Nyeste snapshot med deltaer mod forrige snapshot, beregnet i databasen.
+-- Kaldes fra dashboardet via supabase.rpc("get_latest_kpi").
+create or replace function get_latest_kpi()
+returns json
+language sql
+stable
+as $$
+    select row_to_json(k)
+    from (
+        select
+            created_at,
+            overall_score,
+            gsc_clicks,
+            psi_mobile_score,
+            psi_lcp,
+            semantisk_analyse,
+            coalesce(coalesce(overall_score, 0) - lag(coalesce(overall_score, 0)) over (order by created_at), 0) as delta_score,
+            coalesce(coalesce(gsc_clicks, 0) - lag(coalesce(gsc_clicks, 0)) over (order by created_at), 0) as delta_clicks
+        from (
+            select * from seo_snapshots order by created_at desc limit 2
+        ) recent
+        order by created_at desc
+        limit 1
+    ) k;
+$$;
@@ -0,0 +1,18 @@
+-- M4-reduceret historik for page_performance: pr. side og døgn beholdes kun
+-- første og sidste række samt rækkerne med laveste og højeste position.
+-- Døgnene er UTC-døgn, så de matcher dashboardets floor('D') på UTC-tidsstempler.
+-- Kolonnerne er de samme som i page_performance, så dashboardet kan læse viewet direkte.
+create or replace view page_perf_m4
+with (security_invoker = true)
+as
+select page_name, clicks, impressions, ctr, position, created_at
+from (
+    select
+        page_name, clicks, impressions, ctr, position, created_at,
+        row_number() over (partition by page_name, date_trunc('day', created_at, 'UTC') order by created_at) as rn_first,
+        row_number() over (partition by page_name, date_trunc('day', created_at, 'UTC') order by created_at desc) as rn_last,
+        row_number() over (partition by page_name, date_trunc('day', created_at, 'UTC') order by position nulls last, created_at) as rn_min,
+        row_number() over (partition by page_name, date_trunc('day', created_at, 'UTC') order by position desc nulls last, created_at) as rn_max
+    from page_performance
+) buckets
+where 1 in (rn_first, rn_last, rn_min, rn_max);
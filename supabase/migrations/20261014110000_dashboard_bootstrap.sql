@@ -0,0 +1,20 @@
+-- Samler KPI-rækken og de åbne opgaver i ét kald, så dashboardet kun
+-- behøver én PostgREST round trip ved opstart.
+-- Kaldes fra dashboardet via supabase.rpc("dashboard_bootstrap").
+create or replace function dashboard_bootstrap()
+returns json
+language sql
+stable
+as $$
+    select json_build_object(
+        'kpi', get_latest_kpi(),
+        'tasks', coalesce((
+            select json_agg(t order by t.created_at desc)
+            from (
+                select id, task_name, task_type, priority, description_why, description_how, created_at
+                from seo_tasks
+                where status = 'pending'
+            ) t
+        ), '[]'::json)
+    );
+$$;
@@ -0,0 +1,23 @@
+-- Samme M4-reduktion som page_perf_m4, men kun for rækker fra og med "since".
+-- Filteret lægges på page_performance før vinduesfunktionerne, så et inkrementelt
+-- kald ikke regner row_number() over hele historikken. "since" skal være en
+-- UTC-midnat, så alle døgn i resultatet er fuldstændige.
+-- Kaldes fra dashboardet via supabase.rpc("page_perf_m4_since", {"since": ...}).
+create or replace function page_perf_m4_since(since timestamptz)
+returns setof page_perf_m4
+language sql
+stable
+as $$
+    select page_name, clicks, impressions, ctr, position, created_at
+    from (
+        select
+            page_name, clicks, impressions, ctr, position, created_at,
+            row_number() over (partition by page_name, date_trunc('day', created_at, 'UTC') order by created_at) as rn_first,
+            row_number() over (partition by page_name, date_trunc('day', created_at, 'UTC') order by created_at desc) as rn_last,
+            row_number() over (partition by page_name, date_trunc('day', created_at, 'UTC') order by position nulls last, created_at) as rn_min,
+            row_number() over (partition by page_name, date_trunc('day', created_at, 'UTC') order by position desc nulls last, created_at) as rn_max
+        from page_performance
+        where created_at >= since
+    ) buckets
+    where 1 in (rn_first, rn_last, rn_min, rn_max);
+$$;